@@ -13,14 +13,18 @@ pip install lxml
 # ==========================
 # BLOCK 1 — Imports & Setup
 # ==========================
-import os, re, time, json, logging, hashlib
-from typing import List, Dict, Any, Optional, Tuple
-from urllib.parse import urljoin, urlparse
+import os, re, time, json, logging, hashlib, itertools, threading, functools, heapq, shutil
+from typing import List, Dict, Any, Optional, Tuple, FrozenSet, Iterable, Set, Union
+from urllib.parse import urljoin, urlparse, urlsplit, urlunsplit, parse_qsl, urlencode
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+import urllib3
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
+import lxml.html
+from lxml.html import HtmlElement
 
 # ---- Exa AI config (set env: EXA_API_KEY) ----
 EXA_API_KEY = os.getenv("EXA_API_KEY", "d906a649-ab82-457c-9ece-3ae8d581d7a7").strip()
@@ -33,26 +37,45 @@ logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 USER_AGENT = "PCF-Harvester/3.0 (+https://yourproject.example)"
 REQUEST_TIMEOUT = 30
 THROTTLE_SEC = 0.8
+MAX_WORKERS = 20  # concurrent requests for BFS waves and downloads (<= pool_maxsize)
 
-SESSION = requests.Session()
-SESSION.headers.update({
+DEFAULT_HEADERS = {
     "User-Agent": USER_AGENT,
     "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
     "Accept-Language": "en-US,en;q=0.9",
     "Connection": "keep-alive",
     "Cache-Control": "no-cache",
-})
+}
+
+SESSION = requests.Session()
+SESSION.headers.update(DEFAULT_HEADERS)
 
+# Fail fast: short capped backoff, and only retry statuses that mean "come back
+# later" (honouring Retry-After). POST stays retryable because Exa search is read-only.
 retry = Retry(
-    total=6, connect=3, read=3,
-    backoff_factor=0.8,
-    status_forcelist=[429, 500, 502, 503, 504],
-    allowed_methods=["HEAD", "GET", "POST", "OPTIONS"]
+    total=3, connect=2, read=2,
+    backoff_factor=0.3, backoff_max=5,
+    respect_retry_after_header=True,
+    status_forcelist=[429, 503],
+    allowed_methods=frozenset(["HEAD", "GET", "POST"])
 )
 adapter = HTTPAdapter(max_retries=retry, pool_connections=50, pool_maxsize=50)
 SESSION.mount("https://", adapter)
 SESSION.mount("http://", adapter)
 
+# ---- Bare urllib3 pool for plain HTML GETs (fetch_html) ----
+# Same keep-alive pooling and retry policy, minus requests' per-call framing.
+# Note: it has no cookie jar, so cookies SESSION picked up (e.g. consent cookies
+# from get_html) are not sent on crawl GETs.
+# urllib3 follows redirects itself and counts each hop against `total`, so give
+# redirects their own budget (requests allowed 30) and cap the other kinds per type.
+# SESSION stays for downloads and the Exa JSON API.
+HTTP_RETRY = retry.new(total=None, redirect=30, status=3, other=2)
+HTTP = urllib3.PoolManager(
+    num_pools=10, maxsize=50, retries=HTTP_RETRY,
+    headers={**DEFAULT_HEADERS, **urllib3.util.make_headers(accept_encoding=True)},
+)
+
 
 # In[5]:
 
@@ -78,19 +101,65 @@ ref = {"Referer": f"{urlparse(url).scheme}://{urlparse(url).netloc}/"}
             logging.error("GET failed for %s: %s", url, e2)
             return None
 
-def fetch_html(url: str, timeout: int = REQUEST_TIMEOUT) -> Optional[str]:
+_CHARSET_RE = re.compile(r"""charset=["']?([\w.:-]+)""", re.I)
+
+def fetch_html(url: str, timeout: int = REQUEST_TIMEOUT) -> Optional[Tuple[bytes, Optional[str]]]:
+    """
+    Return (body bytes, HTTP header charset or None). The bytes go to lxml
+    undecoded so it can honour <meta charset> / XML declarations itself.
+    """
     try:
-        r = SESSION.get(url, timeout=timeout)
-        r.raise_for_status()
-        return r.text
+        r = HTTP.request("GET", url, timeout=timeout)
     except Exception as e:
         logging.warning("GET %s failed: %s", url, e)
         return None
+    if not 200 <= r.status < 300:
+        logging.warning("GET %s failed: HTTP %d", url, r.status)
+        return None
+    m = _CHARSET_RE.search(r.headers.get("Content-Type", ""))
+    return r.data, (m.group(1) if m else None)
+
+_XML_DECL_RE = re.compile(r"^\s*<\?xml[^>]*\?>")
+_DECLARED_CHARSET_RE = re.compile(rb"<meta[^>]+charset|<\?xml[^>]+encoding", re.I)
+
+def _html_parser(charset: str) -> lxml.html.HTMLParser:
+    try:
+        return lxml.html.HTMLParser(encoding=charset)
+    except LookupError:  # unknown charset label
+        return lxml.html.HTMLParser(encoding="utf-8")
+
+def parse_links_doc(url: str, html: Union[str, bytes], charset: Optional[str] = None) -> Optional[HtmlElement]:
+    """Parse with lxml directly (no BS4 wrappers) and make all links absolute to url."""
+    parser = None
+    if isinstance(html, bytes):
+        # HTTP header charset wins; else let libxml2 honour <meta charset> / XML
+        # declarations; else UTF-8 (libxml2 on its own would assume Latin-1)
+        if charset or not _DECLARED_CHARSET_RE.search(html[:4096]):
+            parser = _html_parser(charset or "utf-8")
+    else:
+        # lxml rejects str input that carries an XML encoding declaration (XHTML pages)
+        html = _XML_DECL_RE.sub("", html, count=1)
+    try:
+        doc = lxml.html.fromstring(html, parser=parser)
+    except Exception as e:
+        logging.warning("Parse failed for %s: %s", url, e)
+        return None
+    # make_links_absolute turns href="" into the page URL; keep those empty so
+    # callers' "no href" checks still skip them
+    empty = doc.xpath("//a[@href='']")
+    doc.make_links_absolute(url, resolve_base_href=True, handle_failures="ignore")
+    for a in empty:
+        a.set("href", "")
+    return doc
+
+def is_pdf_url_lc(url_lc: str) -> bool:
+    # *_lc predicates take an already-lowercased URL so hot loops lowercase once
+    return url_lc.endswith(".pdf") or ".pdf?" in url_lc
 
 def is_pdf_url(url: str) -> bool:
-    u = url.lower()
-    return u.endswith(".pdf") or ".pdf?" in u
+    return is_pdf_url_lc(url.lower())
 
+@functools.lru_cache(maxsize=4096)  # nav/footer links repeat on every page
 def etld(url: str) -> str:
     try:
         return urlparse(url).netloc.lower()
@@ -100,12 +169,40 @@ def etld(url: str) -> str:
 def sha256_bytes(b: bytes) -> str:
     h = hashlib.sha256(); h.update(b); return h.hexdigest()
 
-def product_type_tokens(ptype: str) -> List[str]:
+TRACKING_PARAMS = {"gclid", "fbclid"}  # plus any utm_* key
+
+def canonicalize_url(u: str) -> str:
+    """
+    Collapse equivalent spellings of a URL into one form: lowercase scheme/host,
+    no default port, no #fragment, no tracking params, sorted query,
+    no trailing slash on non-root paths.
+    """
+    try:
+        p = urlsplit(u.strip())
+    except ValueError:
+        return u
+    scheme = p.scheme.lower()
+    netloc = p.netloc.lower()
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = p.path or "/"
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/") or "/"
+    params = [(k, v) for k, v in parse_qsl(p.query, keep_blank_values=True)
+              if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS]
+    return urlunsplit((scheme, netloc, path, urlencode(sorted(params)), ""))
+
+def _urlkey(u: str) -> bytes:
+    # 8-byte digest of the canonical form; equivalent URLs share one key
+    return hashlib.blake2b(canonicalize_url(u).encode("utf-8"), digest_size=8).digest()
+
+@functools.lru_cache(maxsize=64)
+def product_type_tokens(ptype: str) -> FrozenSet[str]:
     p = (ptype or "").strip().lower()
     tokens = []
 
     if not p:
-        return []
+        return frozenset()
 
     if "laptop" in p or "notebook" in p:
         # Accept any string that ends with "book", like MacBook, Chromebook, Ultrabook
@@ -119,16 +216,26 @@ def product_type_tokens(ptype: str) -> List[str]:
     else:
         tokens.append(p)
 
-    return tokens
+    return frozenset(tokens)
+
+def product_type_synonyms(ptype: str) -> List[str]:
+    # Phrases for search queries; the bare "book" suffix is only useful for matching
+    return sorted(t for t in product_type_tokens(ptype) if t != "book")
+
+# Any word ending in "book" (MacBook, Chromebook, Notebook, Ultrabook, ...)
+_BOOK_RE = re.compile(r"\b\w*book\b")
 
 def merge_pdf_lists(*lists: List[Dict[str, str]]) -> List[Dict[str, str]]:
     seen, merged = set(), []
     for lst in lists:
         for p in lst:
             u = p.get("url")
-            if not u or u in seen: 
+            if not u:
                 continue
-            seen.add(u); merged.append(p)
+            k = _urlkey(u)
+            if k in seen:
+                continue
+            seen.add(k); merged.append(p)
     return merged
 
 
@@ -138,6 +245,21 @@ def merge_pdf_lists(*lists: List[Dict[str, str]]) -> List[Dict[str, str]]:
 # ==========================
 # BLOCK 3 — Exa AI client + fallback
 # ==========================
+EXA_MAX_WORKERS = 6
+EXA_MAX_QPS = 5.0
+
+_EXA_LOCK = threading.Lock()
+_exa_next_at = 0.0
+
+def _exa_throttle() -> None:
+    """Space Exa calls at least 1/EXA_MAX_QPS apart, across all threads."""
+    global _exa_next_at
+    with _EXA_LOCK:
+        now = time.monotonic()
+        at = max(now, _exa_next_at)
+        _exa_next_at = at + 1.0 / EXA_MAX_QPS
+    time.sleep(at - now)
+
 def exa_search(query: str, top_k: int = 20) -> List[Dict[str, Any]]:
     if not EXA_API_KEY:
         logging.error("EXA_API_KEY not set. Exa search disabled.")
@@ -149,6 +271,7 @@ def exa_search(query: str, top_k: int = 20) -> List[Dict[str, Any]]:
         "Content-Type": "application/json",
     }
     payload = {"query": query, "numResults": top_k}
+    _exa_throttle()
     try:
         r = SESSION.post(EXA_ENDPOINT, json=payload, headers=headers, timeout=REQUEST_TIMEOUT)
         r.raise_for_status()
@@ -173,10 +296,13 @@ def harvest_pcf_pdfs_via_search(brand: str, product_type: str, brand_domain: str
         if syn_clause:
             queries.append(f'site:{brand_domain} filetype:pdf {brand} {syn_clause} {kw}')
 
+    # Queries run concurrently; _exa_throttle keeps the total rate within Exa's cap
+    with ThreadPoolExecutor(max_workers=EXA_MAX_WORKERS) as pool:
+        results = list(pool.map(lambda q: exa_search(q, top_k=top_k_per_query), queries))
+
     seen, out = set(), []
-    for q in queries:
-        logging.info("Exa fallback query: %s", q)
-        hits = exa_search(q, top_k=top_k_per_query)
+    for q, hits in zip(queries, results):
+        logging.info("Exa fallback query: %s (%d hit(s))", q, len(hits))
         for h in hits:
             url = (h.get("url") or "").strip()
             title = (h.get("title") or "").strip()
@@ -184,11 +310,11 @@ def harvest_pcf_pdfs_via_search(brand: str, product_type: str, brand_domain: str
                 continue
             if brand_domain not in etld(url):
                 continue
-            if url in seen:
+            k = _urlkey(url)
+            if k in seen:
                 continue
-            seen.add(url)
+            seen.add(k)
             out.append({"url": url, "product_text": title or url.rsplit("/", 1)[-1]})
-        time.sleep(THROTTLE_SEC)
     logging.info("Exa fallback harvested %d PDF(s) for %s/%s", len(out), brand, product_type)
     return out
 
@@ -215,45 +341,50 @@ def harvest_pcf_pdfs_via_search(brand: str, product_type: str, brand_domain: str
     #return landing_url
 from urllib.parse import urlparse
 
-def _score_cta_link(base_url: str, a) -> int:
-    href = a.get("href", "")
-    txt = (a.get_text(" ") or "").strip().lower()
+# Keyword alternations for CTA scoring (one C-level regex pass each)
+_BAD_RE = re.compile(r"support|services|drivers|partners|marketing|blog|press|solution|contact")
+_PDF_HINT_RE = re.compile(r"pcf|carbon|footprint|lca|epd")
+_PCF_RE = re.compile(r"product-carbon|carbon-footprint|product carbon footprint|environmental|epd|sustainab|pcf")
+_PRODUCT_RE = re.compile(r"laptop|desktop|monitor|server|device|book")
+
+def _score_cta_link(base: Tuple[str, str], a: HtmlElement) -> int:
+    """
+    base is (base_netloc, base_prefix), computed once by the caller for all
+    links; a comes from parse_links_doc, so its href is already absolute.
+    """
+    base_netloc, base_prefix = base
+    href: str = a.get("href", "")
+    txt: str = (a.text_content() or "").strip().lower()
     if not href:
         return -999
 
-    abs_url = urljoin(base_url, href)
+    abs_url = href
     s = f"{txt} {abs_url}".lower()
 
     # ❌ Kill immediately if irrelevant section
-    bad = ["support", "services", "drivers", "partners", "marketing", "blog", "press", "solution", "contact"]
-    if any(b in s for b in bad):
+    if _BAD_RE.search(s):
         return -999
 
     # 🎯 Jackpot: direct PDF with strong indicators
-    if href.lower().endswith(".pdf") and any(k in s for k in ["pcf", "carbon", "footprint", "lca", "epd"]):
+    if href.lower().endswith(".pdf") and _PDF_HINT_RE.search(s):
         return 999  # stop right there, valid report found
 
-    score = 0
+    score: int = 0
 
     # ✅ Strong PCF-related content
-    if any(t in s for t in [
-        "product-carbon", "carbon-footprint", "product carbon footprint",
-        "environmental", "product environmental report", "epd", "sustainab", "pcf"
-    ]):
+    if _PCF_RE.search(s):
         score += 10
 
     # 💡 Bonus: product-specific mentions
-# Match product types and any '...book' variants (e.g., MacBook, Notebook, Chromebook)
-    if any(p in s for p in ["laptop", "desktop", "monitor", "server", "device"]) or "book" in s:
-       score += 3
+    # Match product types and any '...book' variants (e.g., MacBook, Notebook, Chromebook)
+    if _PRODUCT_RE.search(s):
+        score += 3
 
 
     # 🔒 Domain and structure boost
-    base = urlparse(base_url)
-    p = urlparse(abs_url)
-    if p.netloc != base.netloc:
+    if urlsplit(abs_url).netloc != base_netloc:
         score -= 5
-    if abs_url.startswith(base_url.rstrip("/")):
+    if abs_url.startswith(base_prefix):
         score += 2
 
     if "#" in href:
@@ -262,16 +393,18 @@ def _score_cta_link(base_url: str, a) -> int:
     return score
 
 def follow_view_pcfs(landing_url: str) -> str:
-    soup = get_html(landing_url)
-    if not soup:
+    page = fetch_html(landing_url)
+    doc = parse_links_doc(landing_url, *page) if page else None
+    if doc is None:
         return landing_url
 
     best_url, best_score = None, -10**9
-    for a in soup.find_all("a", href=True):
-        sc = _score_cta_link(landing_url, a)
+    base = (urlparse(landing_url).netloc, landing_url.rstrip("/"))
+    for a in doc.xpath("//a[@href]"):
+        sc = _score_cta_link(base, a)
         if sc > best_score:
             best_score = sc
-            best_url = urljoin(landing_url, a["href"])
+            best_url = urljoin(landing_url, a.get("href"))
 
     # Only follow if it looks *strongly* like a PCF hub; else stay put
     if best_url and best_score >= 8:
@@ -332,52 +465,58 @@ def resolve_product_tab(pcfs_url: str, product_type: str) -> str:
 # BLOCK 5 — Robust per-page PDF extraction
 # ==========================
 PDF_REGEX = re.compile(r'https?://[^\s"\'<>]+\.pdf(?:\?[^\s"\'<>]*)?', re.I)
-
-def _collect_pdf_links_from_html(url: str, html: str) -> List[Dict[str, str]]:
-    soup = BeautifulSoup(html, "lxml")
-    found: List[Dict[str, str]] = []
-
-    # 1) <a href="...pdf">
-    for a in soup.find_all("a", href=True):
-        href = a["href"]
-        if ".pdf" in href.lower():
-            found.append({"url": urljoin(url, href), "product_text": (a.get_text(" ") or "").strip()})
-
-    # 2) Common data-* attributes
-    ATTRS = ["data-href","data-url","data-download","data-asset-url"]
-    for tag in soup.find_all(True):
-        for attr in ATTRS:
-            val = tag.get(attr)
-            if val and ".pdf" in val.lower():
-                found.append({"url": urljoin(url, val), "product_text": (tag.get_text(" ") or "").strip()})
-
-    # 3) Regex sweep across raw HTML (captures inline JSON/script)
-    for m in PDF_REGEX.finditer(html):
-        found.append({"url": urljoin(url, m.group(0)), "product_text": ""})
-
-    # Dedupe
-    seen, out = set(), []
-    for x in found:
-        u = x["url"]
-        if u in seen: 
-            continue
-        seen.add(u); out.append(x)
+PDF_DATA_ATTRS = ("data-href", "data-url", "data-download", "data-asset-url")
+
+def _collect_pdf_links_from_html(url: str, html: Union[str, bytes],
+                                 charset: Optional[str] = None) -> List[Dict[str, str]]:
+    """Single pass over the DOM; dedupe inline so the first (richest) hit wins."""
+    doc = parse_links_doc(url, html, charset)
+    seen: Set[bytes] = set()
+    out: List[Dict[str, str]] = []
+
+    def emit(u: str, text: str) -> None:
+        k = _urlkey(u)
+        if k not in seen:
+            seen.add(k); out.append({"url": u, "product_text": text})
+
+    if doc is None:
+        # unparseable: sweep the raw markup instead
+        scripts = html.decode(charset or "utf-8", errors="replace") if isinstance(html, bytes) else html
+    else:
+        for el in doc.iter():
+            if not isinstance(el.tag, str):  # comments / processing instructions
+                continue
+            # 1) <a href="...pdf"> (already absolute)
+            if el.tag == "a":
+                href = el.get("href")
+                if href and ".pdf" in href.lower():
+                    emit(href, (el.text_content() or "").strip())
+            # 2) Common data-* attributes
+            for attr in PDF_DATA_ATTRS:
+                val = el.get(attr)
+                if val and ".pdf" in val.lower():
+                    emit(urljoin(url, val), (el.text_content() or "").strip())
+        scripts = "\n".join(doc.xpath("//script/text()"))
+
+    # 3) Regex sweep over inline <script> bodies (captures inline JSON)
+    for m in PDF_REGEX.finditer(scripts):
+        emit(m.group(0), "")
     return out
 
-def extract_pdfs_page_robust(page_url: str, require_tokens: Optional[List[str]] = None) -> List[Dict[str, str]]:
-    html = fetch_html(page_url, REQUEST_TIMEOUT)
-    if html is None:
+def extract_pdfs_page_robust(page_url: str, require_tokens: Optional[Iterable[str]] = None) -> List[Dict[str, str]]:
+    page = fetch_html(page_url, REQUEST_TIMEOUT)
+    if page is None:
         return []
-    pdfs = _collect_pdf_links_from_html(page_url, html)
+    pdfs = _collect_pdf_links_from_html(page_url, *page)
     if require_tokens:
         toks = [t.lower() for t in require_tokens]
         keep: List[Dict[str, str]] = []
         for p in pdfs:
             ctx = (p.get("product_text") or "").lower()
-            if any(t in ctx for t in toks) or re.search(r"\\b\\w*book\\b", ctx): # <- match "MacBook", "Chromebook", etc.
+            if any(t in ctx for t in toks) or _BOOK_RE.search(ctx): # <- match "MacBook", "Chromebook", etc.
                 keep.append(p)
-            logging.info(f"Filtered PDFs using tokens + 'book' logic → kept {len(keep)} of {len(pdfs)}")
-            return keep
+        logging.info(f"Filtered PDFs using tokens + 'book' logic → kept {len(keep)} of {len(pdfs)}")
+        return keep
     return pdfs
 
 
@@ -385,34 +524,38 @@ def extract_pdfs_page_robust(page_url: str, require_tokens: Optional[List[str]]
 
 
 #block 5.5
-def extract_model_pdfs_by_section(soup: BeautifulSoup, product_tokens: List[str]) -> List[Dict[str, str]]:
+def extract_model_pdfs_by_section(doc: HtmlElement, product_tokens: Iterable[str]) -> List[Dict[str, str]]:
     """
     Grouped extraction: find PDFs under sections likely referring to the product type.
-    Uses headings (h2/h3), list items, and anchor tags.
+    Uses headings (h2/h3), list items, and anchor tags; doc is an lxml tree from
+    parse_links_doc (links already absolute), walked once in document order.
     """
     results = []
     current_section = None
-    section_map = {}
 
     # Normalize token list for matching
     tokens = [t.lower() for t in product_tokens]
+    if not tokens:
+        return []
 
-    for tag in soup.find_all(["h2", "h3", "li", "a"]):
-        text = (tag.get_text(" ") or "").strip().lower()
+    for tag in doc.iter("h2", "h3", "li", "a"):
+        if tag.tag == "a":
+            href = tag.get("href")
+            if href and href.endswith(".pdf") and current_section \
+                    and any(tok in current_section for tok in tokens):
+                results.append({
+                    "url": href,
+                    "product_text": (tag.text_content() or "").strip() or current_section
+                })
+            continue
 
-        if tag.name in ["h2", "h3"]:
+        text = (tag.text_content() or "").strip().lower()
+        if tag.tag in ("h2", "h3"):
             # Start of a new section
             current_section = text
-        elif tag.name == "li" and any(tok in text for tok in tokens):
+        elif any(tok in text for tok in tokens):
             # List items that may contain model names
             current_section = text
-        elif tag.name == "a" and tag.has_attr("href") and tag["href"].endswith(".pdf"):
-            href = urljoin(soup.base_url or "", tag["href"])
-            if current_section and any(tok in current_section for tok in tokens):
-                results.append({
-                    "url": href,
-                    "product_text": tag.get_text(" ").strip() or current_section
-                })
 
     return results
 
@@ -421,28 +564,35 @@ def extract_model_pdfs_by_section(soup: BeautifulSoup, product_tokens: List[str]
 
 
 # ==========================
-# BLOCK 6 — Same-domain BFS (depth 2)
+# BLOCK 6 — Same-domain crawl (depth 2, best-first)
 # ==========================
-from collections import deque
+@functools.lru_cache(maxsize=4096)  # nav/footer links repeat on every page
+def _netloc_lc(u_lc: str) -> str:
+    try:
+        return urlsplit(u_lc).netloc
+    except ValueError:
+        return ""
+
+def _same_domain_lc(u_lc: str, dom_lc: str) -> bool:
+    return _netloc_lc(u_lc).endswith(dom_lc)
 
 def _same_domain(u: str, domain: str) -> bool:
-    return etld(u).endswith(domain.lower())
+    return _same_domain_lc(u.lower(), domain.lower())
 
 def _normalize_link(base: str, href: str) -> Optional[str]:
     if not href or href.startswith("javascript:") or href.startswith("mailto:"):
         return None
     return urljoin(base, href)
 
-def is_product_pdf(url: str, product_tokens: Optional[List[str]] = None) -> bool:
+def is_product_pdf_lc(name: str, product_tokens: Optional[Iterable[str]] = None) -> bool:
     """
-    Match PDF filenames to known product tokens or patterns like *book.
+    Match (lowercased) PDF filenames to known product tokens or patterns like *book.
     """
-    if not url.lower().endswith(".pdf"):
+    if not name.endswith(".pdf"):
         return False
-    name = url.lower()
 
     # Regex match: anything ending in 'book' (e.g., MacBook, Notebook, Ultrabook)
-    if re.search(r"\b\w*book\b", name):
+    if _BOOK_RE.search(name):
         return True
 
     if product_tokens:
@@ -450,55 +600,93 @@ def is_product_pdf(url: str, product_tokens: Optional[List[str]] = None) -> bool
     
     return True  # fallback if no tokens provided
 
+def is_product_pdf(url: str, product_tokens: Optional[Iterable[str]] = None) -> bool:
+    return is_product_pdf_lc(url.lower(), product_tokens)
+
+def _score_frontier(url_lc: str, text: str) -> int:
+    """Crawl priority for a queued page: PCF-looking links first, bad sections last."""
+    s = f"{text.lower()} {url_lc}"
+    score = 0
+    if _BAD_RE.search(s):
+        score -= 10
+    if _PCF_RE.search(s):
+        score += 10
+    if _PRODUCT_RE.search(s):
+        score += 3
+    return score
+
 def bfs_collect_pdfs(start_url: str,
                      domain: str,
                      max_pages: int = 60,
                      max_depth: int = 2,
                      per_page_sleep: float = 0.4,
-                     require_tokens: Optional[List[str]] = None) -> List[Dict[str, str]]:
-    visited, q = set(), deque([(start_url, 0)])
+                     require_tokens: Optional[Iterable[str]] = None,
+                     max_workers: int = MAX_WORKERS,
+                     seed_docs: Optional[Dict[str, HtmlElement]] = None) -> List[Dict[str, str]]:
+    """
+    Best-first crawl: the frontier is a heap keyed on _score_frontier (then
+    depth, then discovery order), so max_pages is spent on PCF-looking pages
+    first. Each round pops up to max_workers pages, fetches and parses them
+    concurrently, then walks them in order to push their links.
+    seed_docs maps URLs the caller already fetched to their parse_links_doc
+    tree; those are used instead of fetching and parsing again.
+    """
+    seeds = dict(seed_docs or {})
+
+    def load(u: str) -> Optional[HtmlElement]:
+        if u in seeds:
+            return seeds.pop(u)
+        page = fetch_html(u)
+        return parse_links_doc(u, *page) if page else None
+
+    # URLs are marked visited (by canonical key) when queued, so the frontier
+    # holds no duplicates; the first spelling seen is the one fetched
+    visited = {_urlkey(start_url)}
+    frontier: List[Tuple[int, int, int, str]] = [(0, 0, 0, start_url)]  # (-score, depth, seq, url)
+    seq = itertools.count(1)
+    pdf_seen: Set[bytes] = set()
     all_pdfs: List[Dict[str, str]] = []
     pages_seen = 0
-
-    while q and pages_seen < max_pages:
-        url, depth = q.popleft()
-        if url in visited:
-            continue
-        visited.add(url)
-        pages_seen += 1
-
-        html = fetch_html(url, REQUEST_TIMEOUT)
-        if html is None:
-            continue
-
-        soup = BeautifulSoup(html, "lxml")
-
-        # ---- Extract all PDF links ----
-        page_pdfs = []
-        for a in soup.find_all("a", href=True):
-            href = _normalize_link(url, a["href"])
-            if not href or not is_pdf_url(href):
-                continue
-            if not _same_domain(href, domain):
-                continue
-            if is_product_pdf(href, product_tokens=require_tokens):
-                page_pdfs.append({"url": href, "source": url})
-
-        all_pdfs = merge_pdf_lists(all_pdfs, page_pdfs)
-
-        # ---- Queue next HTML pages ----
-        if depth >= max_depth:
-            continue
-
-        for a in soup.find_all("a", href=True):
-            href = _normalize_link(url, a["href"])
-            if not href or href.lower().endswith(".pdf"):
-                continue
-            if not _same_domain(href, domain):
-                continue
-            q.append((href, depth + 1))
-
-        time.sleep(per_page_sleep)
+    dom_lc = domain.lower()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while frontier and pages_seen < max_pages:
+            n = min(max_workers, max_pages - pages_seen, len(frontier))
+            batch = [heapq.heappop(frontier) for _ in range(n)]
+            pages_seen += n
+
+            docs = pool.map(load, [url for _, _, _, url in batch])
+            for (_, depth, _, url), doc in zip(batch, docs):
+                if doc is None:
+                    continue
+
+                for a in doc.xpath("//a[@href]"):
+                    href = _normalize_link(url, a.get("href"))
+                    if not href:
+                        continue
+                    href_lc = href.lower()
+                    if not _same_domain_lc(href_lc, dom_lc):
+                        continue
+
+                    # ---- Extract PDF links ----
+                    if is_pdf_url_lc(href_lc):
+                        k = _urlkey(href)
+                        if k not in pdf_seen and is_product_pdf_lc(href_lc, require_tokens):
+                            pdf_seen.add(k)
+                            all_pdfs.append({"url": href, "source": url})
+
+                    # ---- Queue next HTML pages ----
+                    # Test the path so .pdf?v=3 / .pdf#p=2 links are never queued as pages
+                    if depth >= max_depth or urlsplit(href_lc).path.endswith(".pdf"):
+                        continue
+                    k = _urlkey(href)
+                    if k in visited:
+                        continue
+                    visited.add(k)
+                    score = _score_frontier(href_lc, a.text_content() or "")
+                    heapq.heappush(frontier, (-score, depth + 1, next(seq), href))
+
+            time.sleep(per_page_sleep)
 
     return all_pdfs
 
@@ -509,39 +697,72 @@ def bfs_collect_pdfs(start_url: str,
 # ==========================
 # BLOCK 7 — Download PDFs
 # ==========================
-def download_all(pdfs: List[Dict[str, str]], brand: str, out_dir: str = "data/pcf") -> List[Dict[str, Any]]:
-    os.makedirs(os.path.join(out_dir, brand.lower()), exist_ok=True)
-    saved: List[Dict[str, Any]] = []
-    for i, p in enumerate(pdfs, 1):
-        url = p["url"]
-        try:
-            head = SESSION.head(url, allow_redirects=True, timeout=REQUEST_TIMEOUT)
-            ct = (head.headers.get("Content-Type") or "").lower()
-            if "pdf" not in ct and not is_pdf_url(url):
-                logging.info("Skip non-PDF: %s (ct=%s)", url, ct)
-                continue
-        except Exception:
-            pass
-        try:
-            r = SESSION.get(url, timeout=REQUEST_TIMEOUT)
+DOWNLOAD_CHUNK = 1 << 16  # 64 KiB stream chunks
+HAS_FADVISE = hasattr(os, "posix_fadvise")  # Linux/BSD only
+
+class _HashingWriter:
+    """Write-through file wrapper that tees every chunk into a hash (for copyfileobj)."""
+    def __init__(self, f, h):
+        self.f, self.h, self.size = f, h, 0
+
+    def write(self, b: bytes) -> int:
+        self.h.update(b)
+        self.size += len(b)
+        return self.f.write(b)
+
+def _download_one(i: int, total: int, p: Dict[str, str], dest_dir: str) -> Optional[Dict[str, Any]]:
+    url = p["url"]
+    # Stream to a .part file, hashing as we go; rename once the digest is known
+    tmp = os.path.join(dest_dir, f"{_urlkey(url).hex()}.part")
+    try:
+        with SESSION.get(url, stream=True, timeout=REQUEST_TIMEOUT) as r:
             r.raise_for_status()
-            blob = r.content
-            digest = sha256_bytes(blob)[:16]
-            fname = f"{digest}.pdf"
-            fpath = os.path.join(out_dir, brand.lower(), fname)
-            with open(fpath, "wb") as f:
-                f.write(blob)
-            saved.append({
-                "url": url,
-                "file": fpath,
-                "bytes": len(blob),
-                "product_text": p.get("product_text","")
-            })
-            logging.info("[%d/%d] Saved %s", i, len(pdfs), fpath)
-            time.sleep(0.3)
-        except Exception as e:
-            logging.warning("Download failed %s: %s", url, e)
-    return saved
+            r.raw.decode_content = True  # undo gzip/deflate transfer encoding
+            first = r.raw.read(DOWNLOAD_CHUNK)
+            # No HEAD preflight: .pdf URLs are trusted as-is; anything else must
+            # declare a PDF content type or start with the %PDF- magic
+            if not is_pdf_url(url):
+                ct = (r.headers.get("Content-Type") or "").lower()
+                if "pdf" not in ct and not first.startswith(b"%PDF-"):
+                    logging.info("Skip non-PDF: %s (ct=%s)", url, ct)
+                    return None
+            with open(tmp, "wb") as f:
+                fd = f.fileno()
+                if HAS_FADVISE:
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                out = _HashingWriter(f, hashlib.sha256())
+                out.write(first)
+                shutil.copyfileobj(r.raw, out, DOWNLOAD_CHUNK)
+                if HAS_FADVISE:
+                    # Never re-read this run: flush to disk, then drop it from the page cache
+                    f.flush()
+                    os.fsync(fd)
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        fpath = os.path.join(dest_dir, f"{out.h.hexdigest()[:16]}.pdf")
+        os.replace(tmp, fpath)
+        logging.info("[%d/%d] Saved %s", i, total, fpath)
+        time.sleep(0.3)
+        return {
+            "url": url,
+            "file": fpath,
+            "bytes": out.size,
+            "product_text": p.get("product_text","")
+        }
+    except Exception as e:
+        logging.warning("Download failed %s: %s", url, e)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return None
+
+def download_all(pdfs: List[Dict[str, str]], brand: str, out_dir: str = "data/pcf",
+                 max_workers: int = MAX_WORKERS) -> List[Dict[str, Any]]:
+    dest_dir = os.path.join(out_dir, brand.lower())
+    os.makedirs(dest_dir, exist_ok=True)
+    total = len(pdfs)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(lambda ip: _download_one(ip[0], total, ip[1], dest_dir),
+                           enumerate(pdfs, 1))
+        return [rec for rec in results if rec]
 
 
 # In[ ]:
@@ -567,6 +788,7 @@ def run_brand_producttype(
     brand = brand.strip()
     product_type = product_type.strip()
     domain = etld(landing_url)
+    tokens = product_type_tokens(product_type)
 
     # ⚠️ Case 1: landing is itself a direct PDF
     if pcfs_url.lower().endswith(".pdf"):
@@ -589,7 +811,7 @@ def run_brand_producttype(
     # ⚠️ Case 2: user confirms the landing page itself contains all relevant PDFs
     if is_pdf_listing_page:
         logging.info("User confirmed this is the PDF listing page. Skipping tab + BFS.")
-        page_pdfs = extract_pdfs_page_robust(pcfs_url, require_tokens=product_type_tokens(product_type))
+        page_pdfs = extract_pdfs_page_robust(pcfs_url, require_tokens=tokens)
         crawled = []
         tab_url = pcfs_url
     else:
@@ -597,18 +819,15 @@ def run_brand_producttype(
         tab_url = resolve_product_tab(pcfs_url, product_type)
         time.sleep(THROTTLE_SEC)
 
-        html = fetch_html(tab_url)
-        if html:
-            soup = BeautifulSoup(html, "lxml")
-            soup.base_url = tab_url
-            page_pdfs = extract_model_pdfs_by_section(soup, product_type_tokens(product_type))
-        else:
-            page_pdfs = []
+        page = fetch_html(tab_url)
+        doc = parse_links_doc(tab_url, *page) if page else None
+        page_pdfs = extract_model_pdfs_by_section(doc, tokens) if doc is not None else []
 
         crawled = bfs_collect_pdfs(
             start_url=tab_url, domain=domain,
             max_pages=60, max_depth=2, per_page_sleep=0.4,
-            require_tokens=product_type_tokens(product_type)
+            require_tokens=tokens,
+            seed_docs={tab_url: doc} if doc is not None else None
         )
 
     # ✅ Merge page + crawl results
@@ -652,7 +871,7 @@ def find_landing_url(brand: str) -> str:
     }
     headers = {"x-api-key": EXA_API_KEY, "User-Agent": USER_AGENT}
     try:
-        r = requests.post(EXA_ENDPOINT, json=payload, headers=headers, timeout=15)
+        r = SESSION.post(EXA_ENDPOINT, json=payload, headers=headers, timeout=15)
         r.raise_for_status()
         data = r.json()
         for item in data.get("results", []):